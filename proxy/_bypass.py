@@ -0,0 +1,89 @@
+import json
+import re
+from ipaddress import ip_address, ip_network, IPv4Network
+from typing import Iterable, Pattern
+
+PAC_PATHS = {"/proxy.pac", "/wpad.dat"}
+PAC_HTTP_HEADERS = ("HTTP/1.1 200 OK\r\n"
+                    "Content-Type: application/x-ns-proxy-autoconfig\r\n"
+                    "Content-Length: {length}\r\n\r\n")
+IPV4_JS_REGEX = r"/^\d+\.\d+\.\d+\.\d+$/"
+DOMAIN_REGEX = re.compile(r"[a-z0-9_\-]+(\.[a-z0-9_\-]+)*")
+
+
+class BypassRules:
+    """
+    Destinations that are connected directly, without restrictions.
+     "networks": IPv4 CIDRs, matched only against hosts given as IP
+      address.
+     "domains": domains, every subdomain is matched too.
+    """
+
+    __slots__ = ("networks", "domains")
+
+    def __init__(self, networks: Iterable[str] = (),
+                 domains: Iterable[str] = ()):
+        self.networks = tuple(ip_network(n, strict=False) for n in networks)
+        for network in self.networks:
+            if not isinstance(network, IPv4Network):
+                raise ValueError(f"Only IPv4 bypass networks are supported, "
+                                 f"got {network}")
+        self.domains = tuple(d.lower().strip(".") for d in domains)
+        for domain in self.domains:
+            if not DOMAIN_REGEX.fullmatch(domain):
+                raise ValueError(f"Invalid bypass domain: {domain!r}")
+
+    def matches(self, hostname: str) -> bool:
+        hostname = hostname.lower()
+        for domain in self.domains:
+            if hostname == domain or hostname.endswith("." + domain):
+                return True
+        if self.networks:
+            try:
+                address = ip_address(hostname)
+            except ValueError:
+                return False
+            return any(address in network for network in self.networks)
+        return False
+
+    def pac(self, proxy_address: str, proxied: Iterable[str] = (),
+            proxied_patterns: Iterable[Pattern] = ()) -> str:
+        """
+        Returns PAC file which sends bypassed destinations direct and
+        everything else through proxy. `proxied` domains and hosts
+        matching `proxied_patterns` always go through proxy, so blacklist
+        and restrictions still apply to them.
+        """
+        proxy = json.dumps(f"PROXY {proxy_address}")
+        lines = ["function FindProxyForURL(url, host) {"]
+        for domain in proxied:
+            lines.append(
+                f"    if (host == {json.dumps(domain)} || "
+                f"dnsDomainIs(host, {json.dumps('.' + domain)})) "
+                f"return {proxy};"
+            )
+        for pattern in proxied_patterns:
+            js_regex = pattern.pattern.replace("/", r"\/")
+            lines.append(f"    if (/{js_regex}/.test(host)) return {proxy};")
+        for domain in self.domains:
+            lines.append(
+                f"    if (host == {json.dumps(domain)} || "
+                f"dnsDomainIs(host, {json.dumps('.' + domain)})) "
+                f'return "DIRECT";'
+            )
+        if self.networks:
+            lines.append(f"    if ({IPV4_JS_REGEX}.test(host)) {{")
+            for network in self.networks:
+                lines.append(
+                    f'        if (isInNet(host, "{network.network_address}", '
+                    f'"{network.netmask}")) return "DIRECT";'
+                )
+            lines.append("    }")
+        lines.append(f"    return {proxy};")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def pac_response(self, proxy_address: str, proxied: Iterable[str] = (),
+                     proxied_patterns: Iterable[Pattern] = ()) -> bytes:
+        body = self.pac(proxy_address, proxied, proxied_patterns).encode()
+        return PAC_HTTP_HEADERS.format(length=len(body)).encode() + body
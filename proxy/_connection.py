@@ -14,6 +14,8 @@ LOGGER = logging.getLogger("proxy.proxy")
 
 class Connection:
 
+    __slots__ = ("client", "server", "pr", "block_images")
+
     def __init__(
             self,
             client_endpoint: Endpoint,
@@ -104,3 +106,15 @@ class Connection:
             query = "Response from server"
         LOGGER.debug(f"{sender_ip:<{len('255.255.255.255')}} "
                      f"{query} {len(data)}")
+
+
+async def pipe(source: Endpoint, destination: Endpoint) -> None:
+    """
+    Forwards data from source to destination as is.
+    """
+    while True:
+        data = await source.read(CHUNK_SIZE)
+        if not data:
+            await destination.close()
+            break
+        await destination.write_and_drain(data)
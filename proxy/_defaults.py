@@ -5,6 +5,8 @@ START_SERVER_MSG = "Serving on {app_address}"
 CONNECTION_ESTABLISHED_MSG = "Connection established: {url}"
 CONNECTION_CLOSED_MSG = "Connection closed: {url}"
 CONNECTION_REFUSED_MSG = "Connection refused: {method} {url}"
+CIRCUIT_OPENED_MSG = ("Upstream is unavailable, failing fast for {cool_down}s: "
+                      "{host}:{port}")
 HANDLING_HTTP_REQUEST_MSG = "Handling HTTP request: {method} {url}"
 HANDLING_HTTPS_CONNECTION_MSG = "Handling HTTPS connection: {url}"
 BLACK_HOLE_MSG = "Black Hole: {url}"
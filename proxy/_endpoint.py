@@ -3,6 +3,8 @@ from asyncio import StreamReader, StreamWriter
 
 class Endpoint:
 
+    __slots__ = ("reader", "writer")
+
     def __init__(self, reader: StreamReader, writer: StreamWriter):
         self.reader = reader
         self.writer = writer
@@ -1,10 +1,32 @@
 import re
+import sys
 from enum import Enum, auto
+from functools import lru_cache
 from pathlib import Path
 
 from proxy._defaults import (LIMITED_RESOURCE_FILE_PATH,
                              BLOCKED_RESOURCE_FILE_PATH)
 
+METHOD_REGEX = re.compile(r"^(\w+)")
+URL_REGEX = re.compile(r"\w+ (.+?) HTTP/\d.\d", re.DOTALL)
+HOST_REGEX = re.compile(r"(^https?://|)(www.)?([A-z.\-0-9]+)")
+PORT_REGEX = re.compile(r":(\d+)(/|$)")
+VK_HELPERS = (
+    re.compile(r".*\.vkuseraudio\.net"),
+    re.compile(r"st\d{1,2}-\d{1,2}\.vk\.com"),
+    re.compile(r"im\.vk\.com"),
+    re.compile(r"sun\d-\d{1,2}\.userapi"),
+    re.compile(r"queuev\d{1,2}\.vk\.com"),
+    re.compile(r"vk\.com")
+)
+YT_HELPERS = (
+    re.compile(r".*yt.*\.com"),  # this just for luck catch
+    re.compile(r"i\.ytimg\.com"),  # youtube images
+    re.compile(r".*\.googlevideo\.com"),  # youtube videos
+    re.compile(r"youtube\.com")
+)
+INITIATOR_HELPERS = {"vk.com": VK_HELPERS, "youtube.com": YT_HELPERS}
+
 
 class HTTPScheme(Enum):
     HTTP = auto()
@@ -13,7 +35,8 @@ class HTTPScheme(Enum):
 
 class ProxyRequest:
     """
-     "raw": raw binary request body.
+     "raw": raw binary request body. None for CONNECT requests since
+      they are never forwarded to the server.
      "method": HTTP request method.
      "abs_url": absolute url requested in HTTP request. May also
       include port at the end.
@@ -22,23 +45,23 @@ class ProxyRequest:
      "scheme": scheme of HTTP connection
     """
 
+    __slots__ = ("raw", "method", "scheme", "abs_url", "hostname", "port",
+                 "restriction", "is_image_request")
+
     def __init__(self, raw_data: bytes, config=None):
-        self.raw = raw_data
-        self._decoded_meta = self.raw.decode()
-        self._method_regex = re.compile(r"^(\w+)")
-        self._url_regex = re.compile(r"\w+ (.+?) HTTP/\d.\d", re.DOTALL)
-        self._host_regex = re.compile(r"(^https?://|)(www.)?([A-z.\-0-9]+)")
-        self._port_regex = re.compile(r":(\d+)/")
-        self.method = re.search(
-            self._method_regex, self._decoded_meta
-        ).group(1)
+        request_line = raw_data.partition(b"\n")[0].decode()
+        self.method = re.search(METHOD_REGEX, request_line).group(1)
         if self.method == "CONNECT":
             self.scheme = HTTPScheme.HTTPS
+            self.raw = None
         else:
             self.scheme = HTTPScheme.HTTP
-        self.abs_url = re.search(self._url_regex, self._decoded_meta).group(1)
-        self.hostname = re.search(self._host_regex, self.abs_url).group(3)
-        port_mo = re.search(self._port_regex, self.abs_url)
+            self.raw = raw_data
+        self.abs_url = re.search(URL_REGEX, request_line).group(1)
+        self.hostname = sys.intern(
+            re.search(HOST_REGEX, self.abs_url).group(3)
+        )
+        port_mo = re.search(PORT_REGEX, self.abs_url)
         if port_mo is not None:
             self.port = int(port_mo.group(1))
         else:
@@ -50,56 +73,56 @@ class ProxyRequest:
             self.restriction = None
         else:
             self.restriction = self._check_restrictions(config)
-        self.is_image_request = False
-        try:
-            if (
-                    self.abs_url.endswith(".jpg") or
-                    self.abs_url.endswith(".jpeg") or
-                    self.abs_url.endswith(".png")
-            ):
-                self.is_image_request = True
-        except UnicodeDecodeError:
-            pass
+        self.is_image_request = (
+                self.abs_url.endswith(".jpg") or
+                self.abs_url.endswith(".jpeg") or
+                self.abs_url.endswith(".png")
+        )
 
     def _check_restrictions(self, config):
-        vk_helpers = [
-            re.compile(r".*\.vkuseraudio\.net"),
-            re.compile(r"st\d{1,2}-\d{1,2}\.vk\.com"),
-            re.compile(r"im\.vk\.com"),
-            re.compile(r"sun\d-\d{1,2}\.userapi"),
-            re.compile(r"queuev\d{1,2}\.vk\.com"),
-            re.compile(r"vk\.com")
-        ]
-        yt_helpers = [
-            re.compile(r".*yt.*\.com"),  # this just for luck catch
-            re.compile(r"i\.ytimg\.com"),  # youtube images
-            re.compile(r".*\.googlevideo\.com"),  # youtube videos
-            re.compile(r"youtube\.com")
-        ]
         initiator = self.hostname
-        if any(re.search(pattern, self.hostname) for pattern in vk_helpers):
-            initiator = "vk.com"
-        elif any(re.search(pattern, self.hostname) for pattern in yt_helpers):
-            initiator = "youtube.com"
+        for helper_initiator, helpers in INITIATOR_HELPERS.items():
+            if any(re.search(pattern, self.hostname) for pattern in helpers):
+                initiator = helper_initiator
+                break
         for hostname in config["black-list"]:
             if hostname == initiator:
-                return RestrictedResource(
-                    initiator,
-                    0,
-                    Path(BLOCKED_RESOURCE_FILE_PATH).read_text()
+                return get_restriction(
+                    initiator, 0, BLOCKED_RESOURCE_FILE_PATH
                 )
         for hostname in config["limited"]:
             if hostname == initiator:
-                return RestrictedResource(
+                return get_restriction(
                     initiator,
                     config["limited"][hostname],
-                    Path(LIMITED_RESOURCE_FILE_PATH).read_text()
+                    LIMITED_RESOURCE_FILE_PATH
                 )
 
 
 class RestrictedResource:
+    """
+    Restriction applied to every request of the initiator. Instances are
+    shared between connections, so they must not be modified.
+    """
+
+    __slots__ = ("initiator", "data_limit", "http_content")
 
     def __init__(self, initiator: str, limit: int, http_content: str):
         self.initiator = initiator
         self.data_limit = limit
         self.http_content = http_content
+
+
+@lru_cache(maxsize=None)
+def read_page(path: Path) -> str:
+    return Path(path).read_text()
+
+
+@lru_cache(maxsize=None)
+def get_restriction(initiator: str, limit: int,
+                    page_path: Path) -> RestrictedResource:
+    """
+    Returns shared restriction for the initiator with HTML page
+    read from `page_path`.
+    """
+    return RestrictedResource(initiator, limit, read_page(page_path))
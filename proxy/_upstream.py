@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from asyncio import StreamReader, StreamWriter, Future
+from time import monotonic
+from typing import Dict, Optional, Tuple
+
+from proxy._defaults import CIRCUIT_OPENED_MSG
+
+FAILURE_THRESHOLD = 5
+COOL_DOWN = 30.0
+CONNECT_TIMEOUT = 10.0
+
+LOGGER = logging.getLogger("proxy.proxy")
+
+
+class UpstreamUnavailable(Exception):
+    """
+    Raised when connection to upstream failed or circuit for it is open.
+    "timed_out" tells whether the last failure was a timeout.
+    """
+
+    def __init__(self, host: str, port: int, timed_out: bool = False):
+        super().__init__(f"{host}:{port}")
+        self.host = host
+        self.port = port
+        self.timed_out = timed_out
+
+
+class _UpstreamState:
+    """
+    Health of single (host, port). Exists only while upstream is failing.
+    """
+
+    __slots__ = ("failures", "failed_at", "opened_at", "timed_out", "pending")
+
+    def __init__(self):
+        self.failures = 0
+        self.failed_at: Optional[float] = None
+        self.opened_at: Optional[float] = None
+        self.timed_out = False
+        self.pending: Optional[Future] = None
+
+
+class CircuitBreaker:
+    """
+    Opens connections to upstreams and tracks consecutive failures for
+    every (host, port). After `failure_threshold` failures in a row
+    requests fail fast for `cool_down` seconds, then a single probe
+    checks whether upstream is back. While upstream is failing only one
+    connection attempt is in flight, others wait for its outcome.
+    Upstreams that didn't fail for two `cool_down` periods are forgotten.
+    """
+
+    def __init__(
+            self,
+            failure_threshold: int = FAILURE_THRESHOLD,
+            cool_down: float = COOL_DOWN,
+            connect_timeout: float = CONNECT_TIMEOUT
+    ):
+        self.failure_threshold = failure_threshold
+        self.cool_down = cool_down
+        self.connect_timeout = connect_timeout
+        self._states: Dict[Tuple[str, int], _UpstreamState] = {}
+        self._swept_at = monotonic()
+
+    def is_open(self, host: str, port: int) -> bool:
+        state = self._states.get((host, port))
+        return (
+                state is not None and
+                state.opened_at is not None and
+                monotonic() - state.opened_at < self.cool_down
+        )
+
+    async def open_connection(
+            self,
+            host: str,
+            port: int
+    ) -> Tuple[StreamReader, StreamWriter]:
+        now = monotonic()
+        if now - self._swept_at >= self.cool_down:
+            self._forget_stale(now)
+        state = self._states.get((host, port))
+        if state is None:
+            return await self._connect(host, port)
+        if state.pending is not None:
+            if not await asyncio.shield(state.pending):
+                raise UpstreamUnavailable(host, port, state.timed_out)
+            return await self._connect(host, port, state)
+        if self.is_open(host, port):
+            raise UpstreamUnavailable(host, port, state.timed_out)
+        state.pending = asyncio.get_running_loop().create_future()
+        succeeded = False
+        try:
+            streams = await self._connect(host, port, state)
+            succeeded = True
+            return streams
+        finally:
+            state.pending.set_result(succeeded)
+            state.pending = None
+
+    async def _connect(
+            self,
+            host: str,
+            port: int,
+            observed: Optional[_UpstreamState] = None
+    ) -> Tuple[StreamReader, StreamWriter]:
+        """
+        Connects to upstream. On success forgets `observed` state, unless
+        it was already replaced by newer one.
+        """
+        try:
+            streams = await asyncio.wait_for(
+                asyncio.open_connection(host, port), self.connect_timeout
+            )
+        except asyncio.TimeoutError as e:
+            self._record_failure(host, port, True)
+            raise UpstreamUnavailable(host, port, True) from e
+        except OSError as e:
+            self._record_failure(host, port, False)
+            raise UpstreamUnavailable(host, port, False) from e
+        if observed is not None and self._states.get((host, port)) is observed:
+            del self._states[(host, port)]
+        return streams
+
+    def _record_failure(self, host: str, port: int, timed_out: bool):
+        state = self._states.setdefault((host, port), _UpstreamState())
+        state.failures += 1
+        state.failed_at = monotonic()
+        state.timed_out = timed_out
+        if state.failures >= self.failure_threshold:
+            state.opened_at = state.failed_at
+            LOGGER.info(CIRCUIT_OPENED_MSG.format(
+                cool_down=self.cool_down, host=host, port=port)
+            )
+
+    def _forget_stale(self, now: float) -> None:
+        self._swept_at = now
+        stale = [
+            address for address, state in self._states.items()
+            if (
+                    state.pending is None and
+                    now - state.failed_at >= 2 * self.cool_down
+            )
+        ]
+        for address in stale:
+            del self._states[address]
@@ -0,0 +1,208 @@
+import asyncio
+import heapq
+from asyncio import StreamReader, StreamWriter
+from collections import deque
+from time import monotonic
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from proxy._upstream import CircuitBreaker, UpstreamUnavailable
+
+TOP_HOSTS = 5
+PER_HOST = 2
+MAX_IDLE = 10
+MAX_AGE = 10.0
+MIN_SCORE = 10.0
+HALF_LIFE = 300.0
+FORGET_SCORE = 0.01
+MAX_TRACKED = 256
+
+Address = Tuple[str, int]
+
+
+class _Popularity:
+    """
+    Counter of requests to single address that halves every `HALF_LIFE`.
+    """
+
+    __slots__ = ("score", "updated_at")
+
+    def __init__(self):
+        self.score = 0.0
+        self.updated_at = monotonic()
+
+    def value(self, now: float, half_life: float) -> float:
+        return self.score * 0.5 ** ((now - self.updated_at) / half_life)
+
+    def hit(self, now: float, half_life: float) -> None:
+        self.score = self.value(now, half_life) + 1
+        self.updated_at = now
+
+
+class WarmPool:
+    """
+    Keeps pre-established connections to the most requested upstreams.
+    At most `per_host` connections are kept for each of `top_hosts`
+    addresses whose popularity is at least `min_score` and `max_idle`
+    in total, every connection is closed after `max_age` seconds if
+    nobody took it.
+    """
+
+    def __init__(
+            self,
+            upstreams: CircuitBreaker,
+            top_hosts: int = TOP_HOSTS,
+            per_host: int = PER_HOST,
+            max_idle: int = MAX_IDLE,
+            max_age: float = MAX_AGE,
+            min_score: float = MIN_SCORE,
+            half_life: float = HALF_LIFE
+    ):
+        for name, value in (("top_hosts", top_hosts),
+                            ("per_host", per_host),
+                            ("max_idle", max_idle),
+                            ("max_age", max_age),
+                            ("min_score", min_score)):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"{name} should be a number, got {value!r}")
+            if value <= 0 and name != "min_score":
+                raise ValueError(f"{name} should be positive, got {value}")
+        self.upstreams = upstreams
+        self.top_hosts = top_hosts
+        self.per_host = per_host
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self.min_score = min_score
+        self.half_life = half_life
+        self._popularity: Dict[Address, _Popularity] = {}
+        self._hot: Set[Address] = set()
+        self._idle: Dict[
+            Address, Deque[Tuple[StreamReader, StreamWriter, float]]
+        ] = {}
+        self._idle_count = 0
+        self._connecting: Dict[Address, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def idle_count(self) -> int:
+        return self._idle_count
+
+    def take(
+            self,
+            host: str,
+            port: int
+    ) -> Optional[Tuple[StreamReader, StreamWriter]]:
+        """
+        Counts request to the address and returns pre-established
+        connection to it if there is one.
+        """
+        address = (host, port)
+        now = monotonic()
+        popularity = self._popularity.get(address)
+        if popularity is None:
+            if len(self._popularity) >= MAX_TRACKED:
+                self._forget_least_popular(now)
+            popularity = self._popularity[address] = _Popularity()
+        popularity.hit(now, self.half_life)
+        streams = None
+        idle = self._idle.get(address)
+        while idle:
+            reader, writer, opened_at = idle.popleft()
+            self._idle_count -= 1
+            if (
+                    now - opened_at < self.max_age and
+                    not writer.is_closing() and
+                    not reader.at_eof()
+            ):
+                streams = reader, writer
+                break
+            writer.close()
+        if address in self._hot:
+            self._fill(address)
+        return streams
+
+    async def run(self) -> None:
+        """
+        Periodically closes expired connections and refills
+        connections to the most popular addresses.
+        """
+        try:
+            while True:
+                self._refresh()
+                await asyncio.sleep(self.max_age / 2)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for idle in self._idle.values():
+            for _, writer, _ in idle:
+                writer.close()
+        self._idle.clear()
+        self._idle_count = 0
+
+    def _refresh(self) -> None:
+        now = monotonic()
+        scores = {}
+        for address, popularity in list(self._popularity.items()):
+            score = popularity.value(now, self.half_life)
+            if score < FORGET_SCORE:
+                del self._popularity[address]
+            elif score >= self.min_score:
+                scores[address] = score
+        self._hot = set(heapq.nlargest(self.top_hosts, scores, key=scores.get))
+        for address, idle in list(self._idle.items()):
+            is_hot = address in self._hot
+            keep = deque()
+            for reader, writer, opened_at in idle:
+                if is_hot and now - opened_at < self.max_age:
+                    keep.append((reader, writer, opened_at))
+                else:
+                    writer.close()
+            self._idle_count -= len(idle) - len(keep)
+            if keep:
+                self._idle[address] = keep
+            else:
+                del self._idle[address]
+        for address in self._hot:
+            self._fill(address)
+
+    def _fill(self, address: Address) -> None:
+        if self.upstreams.is_open(*address):
+            return
+        idle = len(self._idle.get(address, ()))
+        connecting = self._connecting.get(address, 0)
+        while (
+                idle + connecting < self.per_host and
+                self._idle_count + sum(self._connecting.values()) <
+                self.max_idle
+        ):
+            connecting += 1
+            self._connecting[address] = connecting
+            task = asyncio.create_task(self._connect(address))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _connect(self, address: Address) -> None:
+        try:
+            reader, writer = await self.upstreams.open_connection(*address)
+        except UpstreamUnavailable:
+            return
+        finally:
+            self._connecting[address] -= 1
+            if not self._connecting[address]:
+                del self._connecting[address]
+        if address not in self._hot or self._idle_count >= self.max_idle:
+            writer.close()
+            return
+        self._idle.setdefault(address, deque()).append(
+            (reader, writer, monotonic())
+        )
+        self._idle_count += 1
+
+    def _forget_least_popular(self, now: float) -> None:
+        address = min(
+            self._popularity,
+            key=lambda a: self._popularity[a].value(now, self.half_life)
+        )
+        del self._popularity[address]
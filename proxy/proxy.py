@@ -2,11 +2,11 @@ import asyncio
 import logging.config
 import socket
 from asyncio import StreamWriter, StreamReader
-from contextvars import ContextVar
 from itertools import chain
 
+from proxy._bypass import BypassRules, PAC_PATHS
 from proxy._connection import CHUNK_SIZE
-from proxy._connection import Connection
+from proxy._connection import Connection, pipe
 from proxy._defaults import (LOCALHOST,
                              CONNECTION_ESTABLISHED_MSG,
                              HANDLING_HTTP_REQUEST_MSG,
@@ -16,22 +16,38 @@ from proxy._defaults import (LOCALHOST,
                              CONNECTION_CLOSED_MSG)
 from proxy._endpoint import Endpoint
 from proxy._log_config import LOGGING_CONFIG
-from proxy._proxy_request import ProxyRequest, HTTPScheme
+from proxy._proxy_request import (ProxyRequest, HTTPScheme,
+                                  INITIATOR_HELPERS)
+from proxy._upstream import CircuitBreaker, UpstreamUnavailable
+from proxy._warm_pool import WarmPool
 
 logging.config.dictConfig(LOGGING_CONFIG)
 LOGGER = logging.getLogger(__name__)
 
 CONNECTION_ESTABLISHED_HTTP_MSG = b"HTTP/1.1 200 Connection " \
                                   b"established\r\n\r\n"
+BAD_GATEWAY_HTTP_MSG = b"HTTP/1.1 502 Bad Gateway\r\n\r\n"
+GATEWAY_TIMEOUT_HTTP_MSG = b"HTTP/1.1 504 Gateway Timeout\r\n\r\n"
+WARM_POOL_CFG_KEYS = {
+    "top-hosts": "top_hosts",
+    "per-host": "per_host",
+    "max-idle": "max_idle",
+    "max-age": "max_age",
+    "min-score": "min_score",
+}
 
 
 class ProxyServer:
 
     def __init__(self, port: int = 8080, block_images: bool = False, cfg=None):
-        self.connection = ContextVar("connection")
         self.block_images = block_images
         self.port = port
         self._spent_data = {}
+        self._upstreams = CircuitBreaker()
+        self._warm_pool = None
+        self._bypass = BypassRules()
+        proxied = []
+        proxied_patterns = []
         if cfg is not None:
             if isinstance(cfg, dict):
                 self._cfg = cfg
@@ -39,7 +55,28 @@ class ProxyServer:
                 raise ValueError(f"Config should be {dict.__name__} object")
             for rsc in chain(cfg["limited"], cfg["black-list"]):
                 self._spent_data[rsc] = 0
-        self.context_token = None
+            warm_pool_cfg = cfg.get("warm-pool")
+            if warm_pool_cfg is not None:
+                unknown = set(warm_pool_cfg).difference(WARM_POOL_CFG_KEYS)
+                if unknown:
+                    raise ValueError(f"Unknown warm-pool keys: "
+                                     f"{', '.join(sorted(unknown))}")
+                self._warm_pool = WarmPool(self._upstreams, **{
+                    WARM_POOL_CFG_KEYS[key]: value
+                    for key, value in warm_pool_cfg.items()
+                })
+            bypass_cfg = cfg.get("bypass")
+            if bypass_cfg is not None:
+                self._bypass = BypassRules(
+                    bypass_cfg.get("networks", ()),
+                    bypass_cfg.get("domains", ())
+                )
+            proxied = list(chain(cfg["black-list"], cfg["limited"]))
+            for initiator in proxied:
+                proxied_patterns.extend(INITIATOR_HELPERS.get(initiator, ()))
+        self._pac_response = self._bypass.pac_response(
+            f"{LOCALHOST}:{self.port}", proxied, proxied_patterns
+        )
 
     async def run(self):
         """
@@ -51,8 +88,15 @@ class ProxyServer:
         addr = srv.sockets[0].getsockname()
         LOGGER.info(START_SERVER_MSG.format(app_address=addr))
 
-        async with srv:
-            await srv.serve_forever()
+        warm_pool_task = None
+        if self._warm_pool is not None:
+            warm_pool_task = asyncio.create_task(self._warm_pool.run())
+        try:
+            async with srv:
+                await srv.serve_forever()
+        finally:
+            if warm_pool_task is not None:
+                warm_pool_task.cancel()
 
     async def _handle_connection(
             self,
@@ -65,71 +109,116 @@ class ProxyServer:
         """
         try:
             raw_request = await client_reader.read(CHUNK_SIZE)
-            print(raw_request)
             await client_writer.drain()
             if not raw_request:
                 return
             pr = ProxyRequest(raw_request, self._cfg)
-            LOGGER.info(f"{pr.method:<{len('CONNECT')}} "
-                        f"{pr.abs_url}")
+            del raw_request  # this frame lives as long as the tunnel
+            client_endpoint = Endpoint(client_reader, client_writer)
+            if pr.method == "GET" and pr.abs_url in PAC_PATHS:
+                await client_endpoint.write_and_drain(self._pac_response)
+                await client_endpoint.close()
+                return
+            bypass = (
+                    pr.restriction is None and
+                    self._bypass.matches(pr.hostname)
+            )
+            if not bypass:
+                LOGGER.info(f"{pr.method:<{len('CONNECT')}} "
+                            f"{pr.abs_url}")
+            streams = None
+            if (
+                    self._warm_pool is not None and
+                    not bypass and
+                    pr.scheme is HTTPScheme.HTTPS and
+                    not self._is_exhausted(pr.restriction)
+            ):
+                streams = self._warm_pool.take(pr.hostname, pr.port)
             try:
-                server_reader, server_writer = await asyncio.open_connection(
-                    pr.hostname, pr.port)
-            except OSError:
+                if streams is None:
+                    streams = await self._upstreams.open_connection(
+                        pr.hostname, pr.port)
+            except UpstreamUnavailable as e:
                 LOGGER.info(CONNECTION_REFUSED_MSG.format(
                     method=pr.method, url=pr.abs_url))
+                if e.timed_out:
+                    await client_endpoint.write_and_drain(
+                        GATEWAY_TIMEOUT_HTTP_MSG)
+                else:
+                    await client_endpoint.write_and_drain(
+                        BAD_GATEWAY_HTTP_MSG)
+                await client_endpoint.close()
                 return
-            client_endpoint = Endpoint(client_reader, client_writer)
-            server_endpoint = Endpoint(server_reader, server_writer)
+            server_endpoint = Endpoint(*streams)
             conn = Connection(
                 client_endpoint, server_endpoint, pr, self.block_images
             )
-            self.context_token = self.connection.set(conn)
+            if bypass:
+                await self._handle_bypass(conn)
+                return
             if self.block_images and pr.is_image_request:
-                await self.connection.get().reset()
+                await conn.reset()
                 return
             if pr.scheme is HTTPScheme.HTTPS:
-                await self._handle_https()
+                await self._handle_https(conn)
             else:
-                await self._handle_http()
+                await self._handle_http(conn)
         except Exception as e:
             if isinstance(e, ConnectionResetError):
                 LOGGER.info(CONNECTION_CLOSED_MSG.format(url=pr.abs_url))
             else:
                 LOGGER.exception(e)
                 asyncio.get_event_loop().stop()
-            if self.context_token is not None:
-                self.connection.reset(self.context_token)
 
-    async def _handle_http(self) -> None:
+    async def _handle_http(self, conn: Connection) -> None:
         """
         Send HTTP request and then forwards the following HTTP requests.
         """
-        conn = self.connection.get()
         LOGGER.debug(HANDLING_HTTP_REQUEST_MSG.format(
             method=conn.pr.method, url=conn.pr.abs_url)
         )
         await conn.server.write_and_drain(conn.pr.raw)
+        conn.pr.raw = None
         await asyncio.gather(
             conn.forward_to_client(self._spent_data),
             conn.forward_to_server()
         )
 
-    async def _handle_https(self) -> None:
+    async def _handle_bypass(self, conn: Connection) -> None:
+        """
+        Relays bypassed destination as is, without restrictions and logging.
+        """
+        if conn.pr.scheme is HTTPScheme.HTTPS:
+            await conn.client.write_and_drain(CONNECTION_ESTABLISHED_HTTP_MSG)
+        else:
+            await conn.server.write_and_drain(conn.pr.raw)
+            conn.pr.raw = None
+        await asyncio.gather(
+            pipe(conn.client, conn.server),
+            pipe(conn.server, conn.client)
+        )
+
+    async def _handle_https(self, conn: Connection) -> None:
         """
         Handles https connection by making HTTP tunnel.
         """
-        conn = self.connection.get()
         hostname = conn.pr.hostname
         LOGGER.debug(HANDLING_HTTPS_CONNECTION_MSG.format(url=hostname))
-        rsc = conn.pr.restriction
-        if rsc:
-            if self._spent_data[rsc.initiator] >= rsc.data_limit:
-                await conn.reset()
-                return
+        if self._is_exhausted(conn.pr.restriction):
+            await conn.reset()
+            return
         await conn.client.write_and_drain(CONNECTION_ESTABLISHED_HTTP_MSG)
         LOGGER.debug(CONNECTION_ESTABLISHED_MSG.format(url=conn.pr.abs_url))
         await asyncio.gather(
             conn.forward_to_server(),
             conn.forward_to_client(self._spent_data)
         )
+
+    def _is_exhausted(self, rsc) -> bool:
+        """
+        Tells whether data limit of the restriction is already spent.
+        """
+        return (
+                rsc is not None and
+                self._spent_data[rsc.initiator] >= rsc.data_limit
+        )
@@ -0,0 +1,79 @@
+import re
+
+import pytest
+
+from proxy._bypass import BypassRules
+
+
+@pytest.fixture
+def rules():
+    return BypassRules(
+        networks=["10.0.0.0/8", "192.168.1.0/24"],
+        domains=["corp.local", ".intranet"]
+    )
+
+
+@pytest.mark.parametrize("hostname", [
+    "corp.local", "wiki.corp.local", "CORP.LOCAL", "git.intranet",
+    "10.1.2.3", "192.168.1.10"
+])
+def test_matches(rules, hostname):
+    assert rules.matches(hostname)
+
+
+@pytest.mark.parametrize("hostname", [
+    "notcorp.local", "example.com", "192.168.2.10", "11.0.0.1", "intranet.io"
+])
+def test_doesnt_match(rules, hostname):
+    assert not rules.matches(hostname)
+
+
+def test_empty_rules_match_nothing():
+    assert not BypassRules().matches("localhost")
+
+
+def test_pac_sends_bypassed_direct(rules):
+    pac = rules.pac("localhost:8080")
+    assert pac.startswith("function FindProxyForURL(url, host) {")
+    assert 'dnsDomainIs(host, ".corp.local")) return "DIRECT";' in pac
+    assert 'isInNet(host, "10.0.0.0", "255.0.0.0")) return "DIRECT";' in pac
+    assert pac.rstrip().endswith('return "PROXY localhost:8080";\n}')
+
+
+def test_pac_proxies_restricted_first(rules):
+    pac = rules.pac("localhost:8080", ["wiki.corp.local"])
+    proxied = pac.index('"wiki.corp.local"')
+    assert proxied < pac.index('"corp.local"')
+    assert 'return "PROXY localhost:8080";' in pac.splitlines()[1]
+
+
+def test_pac_response_has_content_length(rules):
+    response = rules.pac_response("localhost:8080")
+    headers, body = response.split(b"\r\n\r\n", 1)
+    assert f"Content-Length: {len(body)}".encode() in headers
+
+
+def test_pac_proxies_restricted_patterns(rules):
+    pac = rules.pac("localhost:8080", proxied_patterns=[
+        re.compile(r".*\.googlevideo\.com"), re.compile(r"a/b")
+    ])
+    assert (r'if (/.*\.googlevideo\.com/.test(host)) '
+            r'return "PROXY localhost:8080";') in pac
+    assert r"/a\/b/" in pac
+
+
+def test_pac_escapes_proxied_names(rules):
+    pac = rules.pac("localhost:8080", ['evil"); alert(1); ("'])
+    assert 'host == "evil\\"); alert(1); (\\""' in pac
+
+
+@pytest.mark.parametrize("network", ["fd00::/8", "::1"])
+def test_ipv6_network_is_rejected(network):
+    with pytest.raises(ValueError):
+        BypassRules(networks=[network])
+
+
+@pytest.mark.parametrize("domain", ['corp"local', "corp\\local", "a b"])
+def test_invalid_domain_is_rejected(domain):
+    with pytest.raises(ValueError):
+        BypassRules(domains=[domain])
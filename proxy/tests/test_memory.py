@@ -0,0 +1,126 @@
+import asyncio
+import gc
+import tracemalloc
+from asyncio import StreamReader, StreamWriter
+from unittest.mock import patch
+
+import pytest
+
+from proxy._defaults import LOCALHOST
+from proxy._proxy_request import ProxyRequest
+from proxy.proxy import (ProxyServer, CONNECTION_ESTABLISHED_HTTP_MSG,
+                         LOGGER)
+
+# Bytes the proxy keeps per idle HTTPS tunnel opened through running
+# ProxyServer: request state, handler frames, gather future and forwarding
+# tasks. Cost of the four stream pairs of a tunnel (client, both proxy
+# sides and upstream) is subtracted, it's measured as two direct
+# connections. Measured ~4200 bytes, ~6200 if 2 KB request head leaks.
+IDLE_TUNNEL_BYTES_BUDGET = 5 * 1024
+TUNNELS_COUNT = 100
+# big head makes a leaked request head exceed the budget
+PADDING = b"x" * 2048
+
+CFG = {"limited": {"youtube.com": 10 * 1_000_000}, "black-list": ["vk.com"]}
+
+
+@pytest.fixture(params=[
+    b"CONNECT www.google.com:443 HTTP/1.1\r\n"
+    b"Host: www.google.com:443\r\n"
+    b"Proxy-Connection: keep-alive\r\n\r\n",
+    b"CONNECT youtube.com:443 HTTP/1.1\r\n"
+    b"Host: youtube.com:443\r\n\r\n",
+    b"CONNECT vk.com:443 HTTP/1.1\r\n"
+    b"Host: vk.com:443\r\n\r\n",
+])
+def connect_meta(request):
+    return request.param
+
+
+async def handle_idle(reader: StreamReader, writer: StreamWriter):
+    await reader.read()
+    writer.close()
+
+
+async def open_direct(port: int):
+    return await asyncio.open_connection(LOCALHOST, port)
+
+
+async def open_tunnel(proxy_port: int, server_port: int):
+    reader, writer = await asyncio.open_connection(LOCALHOST, proxy_port)
+    writer.write(b"CONNECT %s:%d HTTP/1.1\r\nUser-Agent: %s\r\n\r\n"
+                 % (LOCALHOST.encode(), server_port, PADDING))
+    await writer.drain()
+    await reader.readexactly(len(CONNECTION_ESTABLISHED_HTTP_MSG))
+    return reader, writer
+
+
+async def traced_memory_per_item(open_item, count: int, opened: list):
+    """
+    Returns traced memory per item, opened items are kept in `opened`
+    so that closing them doesn't affect following measurements.
+    """
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(count):
+        opened.append(await open_item())
+    await asyncio.sleep(0.01)  # let forwarding tasks reach idle read
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    return (after - before) / count
+
+
+@pytest.mark.asyncio
+async def test_idle_tunnel_fits_memory_budget():
+    # log output buffers are not per tunnel state
+    with patch.object(LOGGER, "disabled", True):
+        assert await measure_idle_tunnel() <= IDLE_TUNNEL_BYTES_BUDGET
+
+
+async def measure_idle_tunnel() -> float:
+    server = await asyncio.start_server(handle_idle, LOCALHOST, 0)
+    server_port = server.sockets[0].getsockname()[1]
+    proxy = ProxyServer(cfg=CFG)
+    proxy_server = await asyncio.start_server(
+        proxy._handle_connection, LOCALHOST, 0
+    )
+    proxy_port = proxy_server.sockets[0].getsockname()[1]
+    opened = []
+    async with server, proxy_server:
+        try:
+            # warm up shared caches
+            await traced_memory_per_item(
+                lambda: open_direct(server_port), 5, opened
+            )
+            await traced_memory_per_item(
+                lambda: open_tunnel(proxy_port, server_port), 5, opened
+            )
+            tracemalloc.start()
+            direct = await traced_memory_per_item(
+                lambda: open_direct(server_port), TUNNELS_COUNT, opened
+            )
+            tunnel = await traced_memory_per_item(
+                lambda: open_tunnel(proxy_port, server_port),
+                TUNNELS_COUNT,
+                opened
+            )
+        finally:
+            tracemalloc.stop()
+            for _, writer in opened:
+                writer.close()
+    return tunnel - 2 * direct
+
+
+def test_connect_head_is_released(connect_meta):
+    assert ProxyRequest(connect_meta).raw is None
+
+
+def test_connect_port_is_parsed():
+    meta = b"CONNECT localhost:8443 HTTP/1.1\r\n\r\n"
+    assert ProxyRequest(meta).port == 8443
+
+
+def test_restrictions_are_shared():
+    first = ProxyRequest(b"CONNECT vk.com:443 HTTP/1.1\r\n\r\n", CFG)
+    second = ProxyRequest(b"CONNECT im.vk.com:443 HTTP/1.1\r\n\r\n", CFG)
+    assert first.restriction is second.restriction
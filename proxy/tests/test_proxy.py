@@ -1,4 +1,5 @@
 import asyncio
+import copy
 from asyncio import StreamReader, StreamWriter
 from typing import Callable
 from unittest.mock import patch
@@ -9,6 +10,7 @@ from proxy._defaults import (BLOCKED_RESOURCE_FILE_PATH,
                              LIMITED_RESOURCE_FILE_PATH)
 from proxy._defaults import LOCALHOST
 from proxy._proxy_request import HTTPScheme, RestrictedResource
+from proxy._warm_pool import WarmPool
 from proxy.proxy import ProxyServer
 
 EMPTY_CFG = {"limited": {}, "black-list": []}
@@ -60,6 +62,8 @@ def fill_http_mock(mock, server_port, restriction=None):
     mock_value.port = server_port
     mock_value.scheme = HTTPScheme.HTTP
     mock_value.restriction = restriction
+    # every connection gets its own request, as ProxyRequest does
+    mock.side_effect = lambda *args: copy.copy(mock.return_value)
 
 
 def fill_https_mock(mock, server_port, restriction=None):
@@ -72,6 +76,8 @@ def fill_https_mock(mock, server_port, restriction=None):
     mock_value.port = server_port
     mock_value.scheme = HTTPScheme.HTTPS
     mock_value.restriction = restriction
+    # every connection gets its own request, as ProxyRequest does
+    mock.side_effect = lambda *args: copy.copy(mock.return_value)
 
 
 @pytest.mark.asyncio
@@ -94,6 +100,70 @@ async def test_https_single_request(proxy_port, server_port):
         assert result == b"HTTP/1.1 200 Connection established\r\n\r\n"
 
 
+@pytest.mark.asyncio
+async def test_https_request_with_warm_pool(proxy_port, server_port):
+    pools = []
+    taken = []
+    original_take = WarmPool.take
+
+    def take(pool, host, port):
+        pools.append(pool)
+        taken.append(original_take(pool, host, port))
+        return taken[-1]
+
+    async def send_twice(
+            proxy_port: int,
+            proxy_task: asyncio.Task,
+            server_task: asyncio.Task
+    ):
+        await asyncio.sleep(0.01)  # time to complete setting up servers
+        first_reader, first_writer = await asyncio.open_connection(
+            LOCALHOST, proxy_port
+        )
+        first_writer.write(b"some message")
+        await first_reader.read(4096)
+        pool = pools[0]
+        pool._refresh()
+        await wait_until(lambda: pool.idle_count > 0)
+        return await send_then_recv(proxy_port, proxy_task, server_task)
+
+    with patch("proxy.proxy.ProxyRequest") as PrMock, \
+            patch.object(WarmPool, "take", take):
+        fill_https_mock(PrMock, server_port)
+        cfg = {"limited": {}, "black-list": [],
+               "warm-pool": {"min-score": 0.5}}
+        result = await run_test(cfg, send_twice, proxy_port, server_port)
+        assert result == b"HTTP/1.1 200 Connection established\r\n\r\n"
+        assert len(taken) == 2
+        assert taken[0] is None
+        assert taken[1] is not None
+
+
+@pytest.mark.asyncio
+async def test_https_blacklist_skips_warm_pool(proxy_port, server_port):
+    with patch("proxy.proxy.ProxyRequest") as PrMock, \
+            patch.object(WarmPool, "take") as take:
+        restriction = RestrictedResource(
+            "localhost", 0, BLOCKED_RESOURCE_FILE_PATH.read_text()
+        )
+        fill_https_mock(PrMock, server_port, restriction)
+        cfg = {"limited": {}, "black-list": ["localhost"],
+               "warm-pool": {"min-score": 0.5}}
+        result = await run_test(cfg, send_then_recv, proxy_port, server_port)
+        assert result == b"HTTP/1.1 403\r\n\r\n"
+        take.assert_not_called()
+
+
+@pytest.mark.parametrize("warm_pool_cfg", [
+    {"max-age": 0}, {"per-host": -1}, {"max-idle": 0}, {"max-age": "10"},
+    {"half-life": 1}, {"upstreams": None}
+])
+def test_invalid_warm_pool_cfg(warm_pool_cfg):
+    cfg = {"limited": {}, "black-list": [], "warm-pool": warm_pool_cfg}
+    with pytest.raises(ValueError):
+        ProxyServer(cfg=cfg)
+
+
 @pytest.mark.asyncio
 async def test_http_blacklist(proxy_port, server_port):
     with patch("proxy.proxy.ProxyRequest") as PrMock:
@@ -134,6 +204,63 @@ async def test_http_restrict(proxy_port, server_port):
             assert result == f"HTTP/1.1 200 OK\r\n\r\n{f.read()}".encode()
 
 
+@pytest.mark.asyncio
+async def test_unavailable_upstream(
+        proxy_port, server_port, unused_tcp_port_factory
+):
+    with patch("proxy.proxy.ProxyRequest") as PrMock:
+        fill_https_mock(PrMock, unused_tcp_port_factory())
+        result = await run_test(
+            EMPTY_CFG, send_then_recv, proxy_port, server_port
+        )
+        assert result == b"HTTP/1.1 502 Bad Gateway\r\n\r\n"
+
+
+@pytest.mark.asyncio
+async def test_pac_file(proxy_port, server_port):
+    with patch("proxy.proxy.ProxyRequest") as PrMock:
+        fill_http_mock(PrMock, server_port)
+        PrMock.return_value.abs_url = "/proxy.pac"
+        cfg = {"limited": {}, "black-list": [],
+               "bypass": {"domains": ["corp.local"]}}
+        result = await run_test(cfg, send_then_recv, proxy_port, server_port)
+        assert result.startswith(b"HTTP/1.1 200 OK\r\n")
+        assert b'dnsDomainIs(host, ".corp.local")) return "DIRECT";' in result
+        assert f'return "PROXY localhost:{proxy_port}";'.encode() in result
+
+
+def test_pac_file_proxies_restricted_helpers():
+    cfg = {"limited": {"youtube.com": 10}, "black-list": [],
+           "bypass": {"domains": ["googlevideo.com"]}}
+    pac = ProxyServer(cfg=cfg)._pac_response.decode()
+    helper = pac.index("googlevideo\\.com/.test(host)")
+    assert helper < pac.index('dnsDomainIs(host, ".googlevideo.com")')
+    assert 'return "PROXY' in pac[helper:pac.index("\n", helper)]
+
+
+@pytest.mark.asyncio
+async def test_http_bypass(proxy_port, server_port):
+    with patch("proxy.proxy.ProxyRequest") as PrMock:
+        fill_http_mock(PrMock, server_port)
+        cfg = {"limited": {}, "black-list": [],
+               "bypass": {"domains": [LOCALHOST]}}
+        result = await run_test(cfg, send_then_recv, proxy_port, server_port)
+        assert result == b"response for HTTP request"
+
+
+@pytest.mark.asyncio
+async def test_https_blacklist_is_not_bypassed(proxy_port, server_port):
+    with patch("proxy.proxy.ProxyRequest") as PrMock:
+        restriction = RestrictedResource(
+            "localhost", 0, BLOCKED_RESOURCE_FILE_PATH.read_text()
+        )
+        fill_https_mock(PrMock, server_port, restriction)
+        cfg = {"limited": {}, "black-list": ["localhost"],
+               "bypass": {"domains": [LOCALHOST]}}
+        result = await run_test(cfg, send_then_recv, proxy_port, server_port)
+        assert result == b"HTTP/1.1 403\r\n\r\n"
+
+
 async def send_until_limit(
         proxy_port: int,
         proxy_task: asyncio.Task,
@@ -157,6 +284,14 @@ async def send_until_limit(
         server_task.cancel()
 
 
+async def wait_until(condition: Callable[[], bool], timeout: float = 5):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.001)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
 async def send_then_recv(
         proxy_port: int,
         proxy_task: asyncio.Task,
@@ -0,0 +1,173 @@
+import asyncio
+from unittest.mock import patch, AsyncMock
+
+import pytest
+
+from proxy._defaults import LOCALHOST
+from proxy._upstream import (CircuitBreaker, UpstreamUnavailable,
+                             _UpstreamState)
+
+
+@pytest.fixture
+def clock():
+    """
+    Time seen by CircuitBreaker, tests move it forward by hand.
+    """
+    now = [0.0]
+    with patch("proxy._upstream.monotonic", lambda: now[0]):
+        yield now
+
+
+async def try_connect(breaker: CircuitBreaker, port: int):
+    with pytest.raises(UpstreamUnavailable):
+        await breaker.open_connection(LOCALHOST, port)
+
+
+@pytest.mark.asyncio
+async def test_refused_connection_raises(unused_tcp_port):
+    with pytest.raises(UpstreamUnavailable) as exc_info:
+        await CircuitBreaker().open_connection(LOCALHOST, unused_tcp_port)
+    assert not exc_info.value.timed_out
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=3)
+    with patch("proxy._upstream.asyncio.open_connection",
+               AsyncMock(side_effect=ConnectionRefusedError)) as connect:
+        for _ in range(3):
+            await try_connect(breaker, 1)
+        assert breaker.is_open(LOCALHOST, 1)
+        await try_connect(breaker, 1)
+        assert connect.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_timeout_is_reported():
+    breaker = CircuitBreaker(failure_threshold=1, connect_timeout=0.01)
+
+    async def hang(*args):
+        await asyncio.sleep(1)
+
+    with patch("proxy._upstream.asyncio.open_connection", hang):
+        with pytest.raises(UpstreamUnavailable) as exc_info:
+            await breaker.open_connection(LOCALHOST, 1)
+    assert exc_info.value.timed_out
+    with pytest.raises(UpstreamUnavailable) as exc_info:
+        await breaker.open_connection(LOCALHOST, 1)
+    assert exc_info.value.timed_out
+
+
+async def fail_until_open(breaker: CircuitBreaker, clock: list):
+    with patch("proxy._upstream.asyncio.open_connection",
+               AsyncMock(side_effect=ConnectionRefusedError)):
+        for _ in range(breaker.failure_threshold):
+            await try_connect(breaker, 1)
+    assert breaker.is_open(LOCALHOST, 1)
+    clock[0] += breaker.cool_down
+
+
+@pytest.mark.asyncio
+async def test_single_probe_after_cool_down(clock):
+    breaker = CircuitBreaker(failure_threshold=1)
+    await fail_until_open(breaker, clock)
+    events = []
+
+    async def slow_connect(*args):
+        events.append("start")
+        await asyncio.sleep(0.01)
+        events.append("end")
+        return "reader", "writer"
+
+    with patch("proxy._upstream.asyncio.open_connection", slow_connect):
+        results = await asyncio.gather(
+            *(breaker.open_connection(LOCALHOST, 1) for _ in range(5))
+        )
+    assert results == [("reader", "writer")] * 5
+    # probe goes first, the rest connect only after it succeeded
+    assert events == ["start", "end"] + ["start"] * 4 + ["end"] * 4
+    assert not breaker._states
+
+
+@pytest.mark.asyncio
+async def test_in_flight_attempts_are_deduplicated(clock):
+    breaker = CircuitBreaker(failure_threshold=1)
+    await fail_until_open(breaker, clock)
+
+    async def slow_refuse(*args):
+        await asyncio.sleep(0.01)
+        raise ConnectionRefusedError
+
+    with patch("proxy._upstream.asyncio.open_connection",
+               AsyncMock(side_effect=slow_refuse)) as connect:
+        results = await asyncio.gather(
+            *(breaker.open_connection(LOCALHOST, 1) for _ in range(5)),
+            return_exceptions=True
+        )
+        assert all(isinstance(r, UpstreamUnavailable) for r in results)
+        assert connect.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_upstream_attempts_are_deduplicated(clock):
+    breaker = CircuitBreaker(failure_threshold=3)
+    with patch("proxy._upstream.asyncio.open_connection",
+               AsyncMock(side_effect=ConnectionRefusedError)):
+        await try_connect(breaker, 1)
+    assert not breaker.is_open(LOCALHOST, 1)
+
+    async def slow_refuse(*args):
+        await asyncio.sleep(0.01)
+        raise ConnectionRefusedError
+
+    with patch("proxy._upstream.asyncio.open_connection",
+               AsyncMock(side_effect=slow_refuse)) as connect:
+        await asyncio.gather(
+            *(breaker.open_connection(LOCALHOST, 1) for _ in range(5)),
+            return_exceptions=True
+        )
+        assert connect.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_healthy_upstream_connects_are_concurrent():
+    breaker = CircuitBreaker()
+    events = []
+
+    async def slow_connect(*args):
+        events.append("start")
+        await asyncio.sleep(0.01)
+        events.append("end")
+        return "reader", "writer"
+
+    with patch("proxy._upstream.asyncio.open_connection", slow_connect):
+        await asyncio.gather(
+            *(breaker.open_connection(LOCALHOST, 1) for _ in range(5))
+        )
+    assert events == ["start"] * 5 + ["end"] * 5
+
+
+@pytest.mark.asyncio
+async def test_waiter_keeps_newer_state(clock):
+    breaker = CircuitBreaker(failure_threshold=1)
+    await fail_until_open(breaker, clock)
+    observed = breaker._states[(LOCALHOST, 1)]
+    # meanwhile state was forgotten and upstream failed again
+    newer = breaker._states[(LOCALHOST, 1)] = _UpstreamState()
+    with patch("proxy._upstream.asyncio.open_connection",
+               AsyncMock(return_value=("reader", "writer"))):
+        await breaker._connect(LOCALHOST, 1, observed)
+    assert breaker._states[(LOCALHOST, 1)] is newer
+
+
+@pytest.mark.asyncio
+async def test_stale_upstreams_are_forgotten(clock):
+    breaker = CircuitBreaker(failure_threshold=1)
+    with patch("proxy._upstream.asyncio.open_connection",
+               AsyncMock(side_effect=ConnectionRefusedError)):
+        for port in range(1, 201):
+            await try_connect(breaker, port)
+        assert len(breaker._states) == 200
+        clock[0] += 2 * breaker.cool_down
+        await try_connect(breaker, 1)
+    assert list(breaker._states) == [(LOCALHOST, 1)]
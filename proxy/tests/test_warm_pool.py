@@ -0,0 +1,153 @@
+import asyncio
+from asyncio import StreamReader, StreamWriter
+from unittest.mock import patch
+
+import pytest
+
+from proxy._defaults import LOCALHOST
+from proxy._upstream import CircuitBreaker
+from proxy._warm_pool import WarmPool
+
+
+async def handle(reader: StreamReader, writer: StreamWriter):
+    await reader.read()
+    writer.close()
+
+
+async def setup_server(port: int):
+    return await asyncio.start_server(handle, LOCALHOST, port)
+
+
+@pytest.fixture
+def clock():
+    """
+    Time seen by WarmPool, tests move it forward by hand.
+    """
+    now = [0.0]
+    with patch("proxy._warm_pool.monotonic", lambda: now[0]):
+        yield now
+
+
+async def settle(pool: WarmPool):
+    """
+    Waits until pre-connects started by the pool complete.
+    """
+    while pool._tasks:
+        await asyncio.wait_for(asyncio.wait(set(pool._tasks)), 5)
+
+
+@pytest.mark.asyncio
+async def test_unknown_host_is_not_pooled(unused_tcp_port, clock):
+    async with await setup_server(unused_tcp_port):
+        pool = WarmPool(CircuitBreaker())
+        assert pool.take(LOCALHOST, unused_tcp_port) is None
+        await settle(pool)
+        assert pool.idle_count == 0
+        pool.close()
+
+
+@pytest.mark.asyncio
+async def test_popular_host_is_pooled(unused_tcp_port, clock):
+    async with await setup_server(unused_tcp_port):
+        pool = WarmPool(CircuitBreaker(), per_host=2, min_score=1)
+        pool.take(LOCALHOST, unused_tcp_port)
+        pool._refresh()
+        await settle(pool)
+        assert pool.idle_count == 2
+        streams = pool.take(LOCALHOST, unused_tcp_port)
+        assert streams is not None
+        streams[1].close()
+        await settle(pool)
+        assert pool.idle_count == 2
+        pool.close()
+        assert pool.idle_count == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_is_bounded(unused_tcp_port_factory, clock):
+    ports = [unused_tcp_port_factory() for _ in range(3)]
+    servers = [await setup_server(port) for port in ports]
+    pool = WarmPool(CircuitBreaker(), top_hosts=2, per_host=2, max_idle=3,
+                    min_score=1)
+    for port in ports:
+        pool.take(LOCALHOST, port)
+    pool.take(LOCALHOST, ports[0])
+    pool._refresh()
+    await settle(pool)
+    assert pool.idle_count == 3
+    assert pool.take(LOCALHOST, ports[0]) is not None
+    pool.close()
+    for server in servers:
+        server.close()
+
+
+@pytest.mark.asyncio
+async def test_expired_connections_are_closed(unused_tcp_port, clock):
+    async with await setup_server(unused_tcp_port):
+        pool = WarmPool(CircuitBreaker(), max_age=10, min_score=1)
+        pool.take(LOCALHOST, unused_tcp_port)
+        pool._refresh()
+        await settle(pool)
+        assert pool.idle_count == 2
+        clock[0] += 10
+        assert pool.take(LOCALHOST, unused_tcp_port) is None
+        pool._refresh()
+        assert pool.idle_count == 0
+        pool.close()
+
+
+@pytest.mark.asyncio
+async def test_dead_host_is_not_pooled(unused_tcp_port, clock):
+    pool = WarmPool(CircuitBreaker(failure_threshold=1), min_score=1)
+    pool.take(LOCALHOST, unused_tcp_port)
+    pool._refresh()
+    await settle(pool)
+    assert pool.idle_count == 0
+    assert pool.upstreams.is_open(LOCALHOST, unused_tcp_port)
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_rare_host_is_not_pooled(unused_tcp_port, clock):
+    async with await setup_server(unused_tcp_port):
+        pool = WarmPool(CircuitBreaker(), min_score=2.5)
+        for _ in range(2):
+            pool.take(LOCALHOST, unused_tcp_port)
+        pool._refresh()
+        await settle(pool)
+        assert pool.idle_count == 0
+        pool.take(LOCALHOST, unused_tcp_port)
+        pool._refresh()
+        await settle(pool)
+        assert pool.idle_count == 2
+        pool.close()
+
+
+@pytest.mark.asyncio
+async def test_decayed_host_is_not_refilled(unused_tcp_port, clock):
+    async with await setup_server(unused_tcp_port):
+        pool = WarmPool(CircuitBreaker(), min_score=1, half_life=10)
+        pool.take(LOCALHOST, unused_tcp_port)
+        pool._refresh()
+        await settle(pool)
+        assert pool.idle_count == 2
+        clock[0] += 100 * 10  # popularity halved 100 times
+        pool._refresh()
+        await settle(pool)
+        assert pool.idle_count == 0
+        assert not pool._popularity
+        pool.close()
+
+
+@pytest.mark.parametrize("option", ["top_hosts", "per_host", "max_idle",
+                                    "max_age"])
+def test_non_positive_options_are_rejected(option):
+    with pytest.raises(ValueError):
+        WarmPool(CircuitBreaker(), **{option: 0})
+
+
+@pytest.mark.parametrize("option", ["top_hosts", "per_host", "max_idle",
+                                    "max_age", "min_score"])
+def test_non_numeric_options_are_rejected(option):
+    with pytest.raises(ValueError):
+        WarmPool(CircuitBreaker(), **{option: "10"})